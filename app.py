@@ -8,14 +8,29 @@ from database import (
     record_sale, 
     get_sales_data, 
     get_low_stock_products,
-    schedule_delivery,
+    schedule_deliveries,
     get_scheduled_deliveries,
     confirm_delivery,
     get_profit_data,
-    get_all_deliveries
+    get_all_deliveries,
+    get_data_version,
+    get_analytics_version,
+    get_sales_by_product,
+    get_sales_timeseries,
+    get_sales_date_range,
+    get_archive_periods,
+    archive_closed_periods,
+    days_ago,
+    import_supplier_prices,
+    get_current_prices,
+    get_best_prices,
+    get_cheapest_supplier,
+    get_price_history
 )
-from auth import login_user, logout_user
-from utils import send_supplier_email
+from charts import cached_figure, choose_bucket, current_hour, group_long_tail
+from auth import (login_user, logout_user, ensure_default_users, create_session, verify_session, create_user,
+                  has_users, create_first_owner, ROLES, DEMO_MODE)
+from utils import send_supplier_orders
 
 # Page Config
 st.set_page_config(
@@ -53,17 +68,58 @@ except FileNotFoundError:
 
 # Initialize DB
 init_db()
+ensure_default_users()
+
+# Sales trend ranges in days (None = all time)
+TREND_RANGES = {
+    "Last 7 days": 7,
+    "Last 30 days": 30,
+    "Last 90 days": 90,
+    "Last year": 365,
+    "All time": None
+}
 
 # Session State for Cart
 if "cart" not in st.session_state:
     st.session_state.cart = []
 
+# Session State for Restock Basket (owner orders, grouped by supplier when sent)
+if "restock_basket" not in st.session_state:
+    st.session_state.restock_basket = []
+
+def add_to_restock_basket(product_id, product_name, supplier_email, quantity, unit_price):
+    """
+    Add a line to the restock basket, replacing any pending line for the same product and supplier.
+    A line already emailed but not yet scheduled is never replaced. Returns (success, message).
+    """
+    for line in st.session_state.restock_basket:
+        if line['product_id'] == product_id and line['supplier_email'] == supplier_email and line.get('emailed'):
+            return False, f"{product_name} was already ordered from {supplier_email} and is waiting to be scheduled; send the basket first."
+    st.session_state.restock_basket = [
+        line for line in st.session_state.restock_basket
+        if not (line['product_id'] == product_id and line['supplier_email'] == supplier_email)
+    ]
+    st.session_state.restock_basket.append({
+        "product_id": product_id,
+        "product_name": product_name,
+        "supplier_email": supplier_email,
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "total": quantity * unit_price
+    })
+    return True, f"Added {quantity} x {product_name} for {supplier_email} to the basket."
+
 def main():
-    # Authentication Check
-    if 'user' not in st.session_state:
-        show_login()
+    # Authentication Check (verified sessions are cached, so reruns don't re-hash)
+    user = verify_session(st.session_state.get('session_token'))
+    if not user:
+        logout_user()
+        if has_users():
+            show_login()
+        else:
+            show_first_run()
     else:
-        user = st.session_state['user']
+        st.session_state['user'] = user
         # Sidebar with User Info and Logout
         with st.sidebar:
             st.title("💊 PharmaLink")
@@ -73,6 +129,9 @@ def main():
             if st.button("Logout", type="secondary"):
                 logout_user()
                 st.rerun()
+            
+            if user['role'] == "Owner":
+                show_staff_form()
 
         # Routing based on Role
         if user['role'] == "Owner":
@@ -93,15 +152,58 @@ def show_login():
             if submitted:
                 user = login_user(username, password)
                 if user:
+                    st.session_state['session_token'] = create_session(user)
                     st.session_state['user'] = user
                     st.success("Login successful!")
                     st.rerun()
                 else:
                     st.error("Invalid Username or Password")
         
-        with st.expander("Demo Credentials"):
-            st.write("Owner: `owner` / `admin`")
-            st.write("Attendee: `attendee1` / `user1`")
+        if DEMO_MODE:
+            with st.expander("Demo Credentials"):
+                st.write("Owner: `owner` / `admin`")
+                st.write("Attendee: `attendee1` / `user1`")
+
+def show_first_run():
+    st.markdown("<div style='text-align: center;'><h1>💊 PharmaLink Setup</h1></div>", unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.info("No accounts exist yet. Create the owner account to get started.")
+        with st.form("first_run_form"):
+            name = st.text_input("Full Name")
+            username = st.text_input("Username")
+            password = st.text_input("Password", type="password")
+            confirm = st.text_input("Confirm Password", type="password")
+            submitted = st.form_submit_button("Create Owner Account", use_container_width=True)
+            
+            if submitted:
+                if password != confirm:
+                    st.error("Passwords do not match.")
+                else:
+                    success, msg = create_first_owner(username, password, name or username)
+                    if success:
+                        user = login_user(username, password)
+                        st.session_state['session_token'] = create_session(user)
+                        st.session_state['user'] = user
+                        st.rerun()
+                    else:
+                        st.error(msg)
+
+def show_staff_form():
+    with st.expander("👥 Add Staff"):
+        with st.form("staff_form", clear_on_submit=True):
+            new_name = st.text_input("Full Name")
+            new_username = st.text_input("Username")
+            new_password = st.text_input("Password", type="password")
+            new_role = st.selectbox("Role", ROLES, index=1)
+            
+            if st.form_submit_button("Create User"):
+                success, msg = create_user(new_username, new_password, new_role, new_name)
+                if success:
+                    st.success(msg)
+                else:
+                    st.error(msg)
 
 def show_owner_dashboard(user):
     st.title("Owner Dashboard 📊")
@@ -114,7 +216,6 @@ def show_owner_dashboard(user):
         
         # Metrics
         inventory_df = get_inventory()
-        sales_data = get_sales_data()
         low_stock = get_low_stock_products()
         
         total_revenue, total_expenses = get_profit_data()
@@ -128,22 +229,56 @@ def show_owner_dashboard(user):
         
         st.divider()
         
+        products_version, _, _ = get_data_version()
+        # Sales charts may be built from a lagging analytics snapshot, so key them on the version they reflect
+        analytics_version = get_analytics_version()
+        
         c1, c2 = st.columns(2)
         
         with c1:
             st.subheader("Sales Trends")
-            if not sales_data.empty:
-                # Group by date/product for better chart
-                # Simple bar chart of sales by product
-                fig_sales = px.bar(sales_data, x='name', y='total_price', color='name', title="Revenue by Product")
+            range_label = st.selectbox("Range", list(TREND_RANGES.keys()), index=1)
+            days = TREND_RANGES[range_label]
+            
+            # Builders return None when there is nothing to plot, so a cache hit needs no queries at all
+            def build_trend():
+                if days:
+                    end = pd.Timestamp.now(tz='UTC').tz_localize(None)
+                    start = end - pd.Timedelta(days=days)
+                else:
+                    start, end = get_sales_date_range()
+                    if start is None:
+                        return None
+                bucket = choose_bucket(start, end)
+                trend = get_sales_timeseries(bucket, days=days)
+                if trend.empty:
+                    return None
+                return px.bar(trend, x='period', y='total_price', title=f"Revenue per {bucket}")
+            
+            def build_by_product():
+                by_product = get_sales_by_product(days=days)
+                if by_product.empty:
+                    return None
+                by_product = group_long_tail(by_product, 'name', 'total_price')
+                return px.bar(by_product, x='name', y='total_price', color='name', title="Revenue by Product")
+            
+            fig_trend = cached_figure(("sales_trend", range_label, current_hour()), analytics_version, build_trend)
+            fig_sales = cached_figure(("sales_by_product", range_label, current_hour()), analytics_version, build_by_product)
+            if fig_trend is not None:
+                st.plotly_chart(fig_trend, use_container_width=True)
+            if fig_sales is not None:
                 st.plotly_chart(fig_sales, use_container_width=True)
-            else:
-                st.info("No sales data available yet.")
+            if fig_trend is None and fig_sales is None:
+                st.info("No sales data for this range.")
         
         with c2:
             st.subheader("Inventory Distribution")
             if not inventory_df.empty:
-                fig_stock = px.pie(inventory_df, values='quantity', names='name', title="Stock Distribution")
+                def build_stock():
+                    stock = group_long_tail(inventory_df, 'name', 'quantity')
+                    return px.pie(stock, values='quantity', names='name', title="Stock Distribution")
+                
+                fig_stock = cached_figure("stock_distribution", (products_version,), build_stock)
                 st.plotly_chart(fig_stock, use_container_width=True)
             else:
                 st.info("Inventory is empty.")
@@ -163,31 +298,97 @@ def show_owner_dashboard(user):
     with tab3:
         st.header("Contact Suppliers 📧")
         
+        # Create a lookup for product IDs
+        inv_map = {row['name']: row['id'] for _, row in inventory_df.iterrows()} if not inventory_df.empty else {}
+        product_name = st.selectbox("Select Product to Restock", list(inv_map.keys()) if inv_map else [])
+        
+        # Prefill supplier and price from the cheapest catalog offer, if any
+        best_offer = get_cheapest_supplier(inv_map[product_name]) if product_name else None
+        if best_offer:
+            st.caption(f"Best catalog price: ${best_offer['unit_price']:,.2f} from {best_offer['supplier_name']} ({best_offer['price_date']})")
+        
         with st.form("supplier_email_form"):
             col_a, col_b = st.columns(2)
             with col_a:
-                supplier_email = st.text_input("Supplier Email")
-                # Create a lookup for product IDs
-                inv_map = {row['name']: row['id'] for _, row in inventory_df.iterrows()} if not inventory_df.empty else {}
-                product_name = st.selectbox("Select Product to Restock", list(inv_map.keys()) if inv_map else [])
+                supplier_email = st.text_input("Supplier Email", value=(best_offer or {}).get('supplier_email') or "", key=f"supplier_email_{product_name}")
             with col_b:
                 quantity = st.number_input("Quantity Required", min_value=1, value=50)
-                target_price = st.number_input("Target Buy Price (Per Unit)", min_value=0.0, value=5.0, step=0.5, format="%.2f")
+                target_price = st.number_input("Target Buy Price (Per Unit)", min_value=0.0, value=float(best_offer['unit_price']) if best_offer else 5.0,
+                                               step=0.5, format="%.2f", key=f"target_price_{product_name}")
             
-            submit_email = st.form_submit_button("Send Restock Request")
+            submit_add = st.form_submit_button("Add to Restock Basket")
             
-            if submit_email:
+            if submit_add:
                 if supplier_email and product_name:
-                    success, msg = send_supplier_email(supplier_email, product_name, quantity, user['name'])
+                    success, msg = add_to_restock_basket(inv_map[product_name], product_name, supplier_email, quantity, target_price)
                     if success:
-                        # Schedule the delivery in specific status
-                        product_id = inv_map[product_name]
-                        schedule_delivery(product_id, quantity, user['name'], cost_price=target_price)
-                        st.success(f"Request sent! scheduled delivery of {quantity} x {product_name} created (Est. Cost: ${target_price * quantity}).")
+                        st.success(msg)
                     else:
-                        st.error(msg)
+                        st.warning(msg)
                 else:
                     st.warning("Please fill in all fields.")
+        
+        if not low_stock.empty and st.button("➕ Add All Low-Stock Items"):
+            # Restock to twice the minimum level from the cheapest catalog supplier
+            skipped, awaiting = [], []
+            for _, row in low_stock.iterrows():
+                offer = get_cheapest_supplier(row['id'])
+                if offer and offer['supplier_email']:
+                    restock_qty = max(int(row['min_stock_level']) * 2 - int(row['quantity']), 1)
+                    success, _ = add_to_restock_basket(int(row['id']), row['name'], offer['supplier_email'], restock_qty, float(offer['unit_price']))
+                    if not success:
+                        awaiting.append(row['name'])
+                else:
+                    skipped.append(row['name'])
+            if skipped:
+                st.warning(f"No catalog supplier with an email for: {', '.join(skipped)}")
+            if awaiting:
+                st.warning(f"Already ordered and waiting to be scheduled: {', '.join(awaiting)}")
+        
+        # Restock Basket: one consolidated order per supplier, all lines scheduled in one transaction
+        st.subheader("🧺 Restock Basket")
+        if st.session_state.restock_basket:
+            col_send, col_clear = st.columns(2)
+            
+            if col_send.button("📧 Send Orders", type="primary"):
+                basket = st.session_state.restock_basket
+                # Lines already emailed on an earlier attempt are only scheduled, never re-sent
+                orders = {}
+                for line in basket:
+                    if not line.get('emailed'):
+                        orders.setdefault(line['supplier_email'], []).append(line)
+                
+                results = send_supplier_orders(orders, user['name']) if orders else {}
+                for line in basket:
+                    if results.get(line['supplier_email'], (False, None))[0]:
+                        line['emailed'] = True
+                for supplier_email, (success, msg) in results.items():
+                    if not success:
+                        st.error(f"{supplier_email}: {msg}")
+                
+                emailed = [line for line in basket if line.get('emailed')]
+                if emailed:
+                    success, msg = schedule_deliveries([(line['product_id'], line['quantity'], line['unit_price']) for line in emailed], user['name'])
+                    if success:
+                        st.success(f"Orders sent to {len({line['supplier_email'] for line in emailed})} supplier(s). {msg} "
+                                   f"Est. Cost: ${sum(line['total'] for line in emailed):,.2f}")
+                        # Keep only the lines whose supplier could not be reached
+                        st.session_state.restock_basket = [line for line in basket if not line.get('emailed')]
+                    else:
+                        st.error(f"{msg}. The orders were emailed; press Send Orders again to schedule them without re-sending.")
+            
+            if col_clear.button("🗑️ Clear Basket"):
+                st.session_state.restock_basket = []
+                st.rerun()
+            
+            if st.session_state.restock_basket:
+                basket_df = pd.DataFrame([{**line, "status": "Emailed, not scheduled" if line.get('emailed') else "Pending"}
+                                          for line in st.session_state.restock_basket])
+                for supplier_email, group in basket_df.groupby('supplier_email'):
+                    st.markdown(f"**{supplier_email}** — {len(group)} item(s), Est. Cost: ${group['total'].sum():,.2f}")
+                    st.dataframe(group[['product_name', 'quantity', 'unit_price', 'total', 'status']], use_container_width=True)
+        else:
+            st.info("Restock basket is empty.")
 
         st.divider()
         st.subheader("📦 Supplies History")
@@ -195,7 +396,10 @@ def show_owner_dashboard(user):
         # New: Get and display all confirmation/scheduled supplies
         from database import get_all_deliveries # Local import or move to top if preferred. Moving to top is cleaner but this works for snippet.
         
-        supplies_df = get_all_deliveries()
+        # Defaults to a recent window so the archives are only attached when asked for
+        supplies_range = st.selectbox("Period", list(TREND_RANGES.keys()), index=2, key="supplies_range")
+        supplies_days = TREND_RANGES[supplies_range]
+        supplies_df = get_all_deliveries(start=days_ago(supplies_days) if supplies_days else None)
         if not supplies_df.empty:
             st.dataframe(supplies_df, use_container_width=True)
         else:
@@ -204,10 +408,53 @@ def show_owner_dashboard(user):
     # --- Tab 4: Market Search (Replaces AI) ---
     with tab4:
         st.header("Market Search 🔍")
-        st.caption("Search Google for market prices, drug interactions, or inventory tips.")
+        st.caption("Compare supplier prices from imported price lists, or search Google for anything else.")
         
-        search_query = st.text_input("Enter search query", placeholder="e.g., Paracetamol wholesale price Kenya")
+        search_query = st.text_input("Enter search query", placeholder="e.g., Paracetamol")
         
+        # 1. Local supplier price catalog
+        st.subheader("💰 Best Supplier Prices")
+        best_prices = get_best_prices(search=search_query or None)
+        if not best_prices.empty:
+            st.dataframe(best_prices[['name', 'supplier_name', 'unit_price', 'price_date', 'supplier_email']], use_container_width=True)
+            
+            price_map = dict(zip(best_prices['name'], best_prices['product_id']))
+            history_product = st.selectbox("Price history for", list(price_map.keys()))
+            if history_product:
+                product_id = price_map[history_product]
+                c_offers, c_history = st.columns(2)
+                with c_offers:
+                    st.write("##### Current offers")
+                    st.dataframe(get_current_prices(product_id=product_id)[['supplier_name', 'unit_price', 'price_date']], use_container_width=True)
+                with c_history:
+                    history = get_price_history(product_id)
+                    fig_history = px.line(history, x='price_date', y='unit_price', color='supplier_name', markers=True, title=f"{history_product} price history")
+                    st.plotly_chart(fig_history, use_container_width=True)
+        else:
+            st.info("No catalog prices found. Import a supplier price list below.")
+        
+        with st.expander("Import Supplier Price List"):
+            st.caption("CSV with columns product, supplier, price and optionally email and date.")
+            with st.form("price_list_form"):
+                price_file = st.file_uploader("Price list (CSV)", type=["csv"])
+                import_supplier = st.text_input("Supplier Name (if not in file)")
+                import_email = st.text_input("Supplier Email (if not in file)")
+                import_date = st.date_input("Price Date (if not in file)")
+                
+                if st.form_submit_button("Import Prices"):
+                    if price_file:
+                        success, msg = import_supplier_prices(price_file, supplier_name=import_supplier or None,
+                                                              supplier_email=import_email or None, price_date=str(import_date))
+                        if success:
+                            st.success(msg)
+                        else:
+                            st.error(msg)
+                    else:
+                        st.warning("Please choose a file.")
+        
+        st.divider()
+        
+        # 2. Web search fallback
         if st.button("Search Google", type="primary"):
             if search_query:
                 url = f"https://www.google.com/search?q={search_query}"
@@ -248,21 +495,45 @@ def show_owner_dashboard(user):
         # 2. Detailed Entries Section
         st.subheader("Historical Transaction Logs")
         
+        log_range = st.selectbox("Period", list(TREND_RANGES.keys()), index=1, key="log_range")
+        log_days = TREND_RANGES[log_range]
+        log_start = days_ago(log_days) if log_days else None
+        
         log_tab1, log_tab2 = st.tabs(["📊 Sales Entries", "📦 Delivery Entries"])
         
         with log_tab1:
-            sales_df = get_sales_data()
+            sales_df = get_sales_data(start=log_start)
             if not sales_df.empty:
                 st.dataframe(sales_df, use_container_width=True)
             else:
                 st.info("No sales entries found.")
                 
         with log_tab2:
-            deliveries_df = get_all_deliveries()
+            deliveries_df = get_all_deliveries(start=log_start)
             if not deliveries_df.empty:
                 st.dataframe(deliveries_df, use_container_width=True)
             else:
                 st.info("No delivery entries found.")
+        
+        st.divider()
+        
+        # 3. Archival of closed months
+        with st.expander("🗄️ Archive Old Records"):
+            st.caption("Move closed months of sales and received deliveries out of the live database. Archived records still appear in reports for their period.")
+            keep_months = st.number_input("Months to keep live", min_value=1, value=3)
+            if st.button("Archive Closed Months"):
+                results = archive_closed_periods(keep_months=int(keep_months))
+                if not results:
+                    st.info("Nothing to archive.")
+                for success, msg in results:
+                    if success:
+                        st.success(msg)
+                    else:
+                        st.error(msg)
+            
+            archive_df = get_archive_periods()
+            if not archive_df.empty:
+                st.dataframe(archive_df, use_container_width=True)
 
 def show_attendee_dashboard(user):
     st.title("Attendee Dashboard 📋")
@@ -271,7 +542,7 @@ def show_attendee_dashboard(user):
     
     tab1, tab2 = st.tabs(["📝 Sales Cart", "📦 Confirmed Deliveries"])
     
-    inventory_df = get_inventory()
+    inventory_df = get_inventory(columns=['id', 'name', 'price'])
     
     # --- Tab 1: Sales Cart ---
     with tab1:
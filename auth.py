@@ -1,7 +1,16 @@
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
 import streamlit as st
+from database import get_connection
 
-# Hardcoded users for prototype
-USERS = {
+# Demo accounts, seeded into an empty users table only when PHARMA_DEMO_USERS=1
+# (passwords are hashed on insert)
+DEMO_USERS = {
     "owner": {
         "password": "admin",
         "role": "Owner",
@@ -24,15 +33,204 @@ USERS = {
     }
 }
 
+ROLES = ("Owner", "Attendee")
+
+DEMO_MODE = os.environ.get("PHARMA_DEMO_USERS", "") == "1"
+# Outside demo mode, the first owner comes from these, or from the app's first-run form
+OWNER_USERNAME = os.environ.get("PHARMA_OWNER_USERNAME", "owner")
+OWNER_PASSWORD = os.environ.get("PHARMA_OWNER_PASSWORD")
+
+# scrypt cost parameters (~50ms per hash)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# Session tokens are HMAC-signed; set PHARMA_SESSION_SECRET to keep them valid across restarts
+SESSION_SECRET = os.environ.get("PHARMA_SESSION_SECRET", "").encode() or secrets.token_bytes(32)
+SESSION_LIFETIME = 12 * 60 * 60
+SESSION_CACHE_TTL = 5 * 60
+
+_session_cache = {}
+_revoked_tokens = {}
+_cache_lock = threading.Lock()
+
+def hash_password(password, salt=None):
+    """Return a salted scrypt hash encoded as 'scrypt$n$r$p$salt$hash'."""
+    salt = salt or secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+def verify_password(password, encoded):
+    """Check a password against a hash produced by hash_password."""
+    # A malformed stored hash (bad hex, non-integer or invalid cost values) counts as a failed login
+    try:
+        scheme, n, r, p, salt, expected = encoded.split("$")
+        if scheme != "scrypt":
+            return False
+        digest = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p), dklen=len(expected) // 2)
+    except (AttributeError, ValueError):
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+# Compared against when the username is unknown, so failed logins cost the same either way
+_DUMMY_HASH = hash_password(secrets.token_hex(8))
+
+def create_user(username, password, role, name):
+    """Add a user with a hashed password. Returns (success, message)."""
+    if role not in ROLES:
+        return False, f"Unknown role: {role}"
+    if not username or not password:
+        return False, "Username and password are required."
+
+    password_hash = hash_password(password)
+    conn = get_connection()
+    try:
+        conn.execute("INSERT INTO users (username, password_hash, role, name) VALUES (?, ?, ?, ?)",
+                     (username, password_hash, role, name))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        return False, f"User '{username}' already exists."
+    finally:
+        conn.close()
+    return True, f"User '{username}' created."
+
+def has_users():
+    """True once at least one account exists."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM users LIMIT 1")
+    row = c.fetchone()
+    conn.close()
+    return row is not None
+
+def create_first_owner(username, password, name):
+    """Create the first Owner account, only while the users table is empty. Returns (success, message)."""
+    if not username or not password:
+        return False, "Username and password are required."
+
+    password_hash = hash_password(password)
+    conn = get_connection()
+    c = conn.cursor()
+    # The emptiness check and the insert are one statement, so two first-run submits can't both win
+    c.execute('''
+        INSERT INTO users (username, password_hash, role, name)
+        SELECT ?, ?, 'Owner', ? WHERE NOT EXISTS (SELECT 1 FROM users)
+    ''', (username, password_hash, name))
+    conn.commit()
+    created = c.rowcount == 1
+    conn.close()
+    if not created:
+        return False, "An account already exists; please log in."
+    return True, f"Owner '{username}' created."
+
+def ensure_default_users():
+    """
+    Seed an empty users table: the demo accounts when PHARMA_DEMO_USERS=1, otherwise an owner
+    from PHARMA_OWNER_USERNAME/PHARMA_OWNER_PASSWORD if set. With neither, the table stays
+    empty and the app asks for the first owner instead.
+    """
+    if has_users():
+        return
+    if DEMO_MODE:
+        conn = get_connection()
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, password_hash, role, name) VALUES (?, ?, ?, ?)",
+            [(username, hash_password(info["password"]), info["role"], info["name"]) for username, info in DEMO_USERS.items()]
+        )
+        conn.commit()
+        conn.close()
+    elif OWNER_PASSWORD:
+        create_first_owner(OWNER_USERNAME, OWNER_PASSWORD, "Owner")
+
+def _get_user(username):
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT username, password_hash, role, name FROM users WHERE username = ? AND active = 1", (username,))
+    row = c.fetchone()
+    conn.close()
+    return row
+
 def login_user(username, password):
     """Verify credentials and return user info if valid."""
-    if username in USERS:
-        if USERS[username]["password"] == password:
-            return USERS[username]
+    row = _get_user(username)
+    if not row:
+        verify_password(password, _DUMMY_HASH)
+        return None
+
+    username, password_hash, role, name = row
+    if verify_password(password, password_hash):
+        return {"username": username, "role": role, "name": name}
     return None
 
+def _sign(payload):
+    return hmac.new(SESSION_SECRET, payload.encode(), hashlib.sha256).hexdigest()
+
+def create_session(user):
+    """Issue a signed session token 'username:expires:nonce:signature' for a logged-in user."""
+    expires = int(time.time()) + SESSION_LIFETIME
+    payload = f"{user['username']}:{expires}:{secrets.token_hex(8)}"
+    token = f"{payload}:{_sign(payload)}"
+    with _cache_lock:
+        _session_cache[token] = (user, min(time.time() + SESSION_CACHE_TTL, expires))
+    return token
+
+def verify_session(token):
+    """
+    Return the user for a valid session token, or None.
+    Verified sessions are cached for SESSION_CACHE_TTL so reruns skip the signature check and user lookup.
+    """
+    if not token:
+        return None
+
+    now = time.time()
+    with _cache_lock:
+        cached = _session_cache.get(token)
+        if cached and cached[1] > now:
+            return cached[0]
+        if token in _revoked_tokens:
+            return None
+
+    try:
+        username, expires, nonce, signature = token.rsplit(":", 3)
+        expires = int(expires)
+    except ValueError:
+        return None
+    if expires <= now or not hmac.compare_digest(signature, _sign(f"{username}:{expires}:{nonce}")):
+        return None
+
+    # Re-read the user so deactivated accounts and role changes apply within one cache TTL
+    row = _get_user(username)
+    if not row:
+        return None
+    user = {"username": row[0], "role": row[2], "name": row[3]}
+
+    with _cache_lock:
+        _session_cache[token] = (user, min(now + SESSION_CACHE_TTL, expires))
+        # Drop expired entries so the cache stays bounded by active sessions
+        for key in [key for key, (_, until) in _session_cache.items() if until <= now]:
+            del _session_cache[key]
+    return user
+
+def revoke_session(token):
+    """Invalidate a session token before it expires."""
+    if not token:
+        return
+    try:
+        expires = int(token.rsplit(":", 3)[1])
+    except (IndexError, ValueError):
+        return
+    now = time.time()
+    with _cache_lock:
+        _session_cache.pop(token, None)
+        _revoked_tokens[token] = expires
+        for key in [key for key, until in _revoked_tokens.items() if until <= now]:
+            del _revoked_tokens[key]
+
 def logout_user():
-    """Clear session state for logout."""
+    """Revoke the session token and clear session state for logout."""
+    revoke_session(st.session_state.get('session_token'))
+    if 'session_token' in st.session_state:
+        del st.session_state['session_token']
     if 'user' in st.session_state:
         del st.session_state['user']
     if 'role' in st.session_state:
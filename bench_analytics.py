@@ -0,0 +1,102 @@
+"""
+Benchmark the analytical reads on the SQLite row store vs DuckDB over a Parquet snapshot of the same data.
+
+    python bench_analytics.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import database
+from bench_dataframes import generate_history
+
+# (name, call, whether 'auto' lets it read a lagging snapshot)
+REPORTS = [
+    ("get_profit_data", lambda engine: database.get_profit_data(engine=engine), False),
+    ("get_sales_by_product", lambda engine: database.get_sales_by_product(engine=engine), True),
+    ("get_sales_by_product(90d)", lambda engine: database.get_sales_by_product(days=90, engine=engine), True),
+    ("get_sales_timeseries(week)", lambda engine: database.get_sales_timeseries('week', engine=engine), True),
+    ("get_sales_timeseries(day,30d)", lambda engine: database.get_sales_timeseries('day', days=30, engine=engine), True),
+    ("get_sales_date_range", lambda engine: database.get_sales_date_range(engine=engine), True),
+    ("get_sales_data", lambda engine: database.get_sales_data(engine=engine), False),
+    ("get_all_deliveries", lambda engine: database.get_all_deliveries(engine=engine), False),
+]
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def median_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+def run_writer(stop, rate, product_ids):
+    """Record sales at roughly `rate` per second until stop is set, like a trading shop."""
+    rng = random.Random(1)
+    while not stop.is_set():
+        database.record_sale(rng.choice(product_ids), 1, "BenchWriter")
+        stop.wait(1 / rate)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite and DuckDB for the analytical reads.")
+    parser.add_argument("--rows", type=int, default=1000000, help="Number of sales rows to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per report (best is reported; auto reports the median)")
+    parser.add_argument("--keep-months", type=int, default=3, help="Archive everything older than this many months (0 = no archiving)")
+    parser.add_argument("--write-rate", type=float, default=5.0, help="Sales per second recorded while 'auto' is measured")
+    parser.add_argument("--db", help="Path for the generated database (default: a temp file)")
+    args = parser.parse_args()
+
+    if database.duckdb is None:
+        print("DuckDB is not installed; install duckdb to compare engines.")
+        return
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="pharma_bench_"), "bench.db")
+    print(f"Generating {args.rows} sales rows in {db_path}...")
+    generate_history(db_path, args.rows)
+    if args.keep_months:
+        archived = [msg for ok, msg in database.archive_closed_periods(args.keep_months) if ok]
+        print(f"Archived {len(archived)} months older than {args.keep_months} months")
+
+    start = time.perf_counter()
+    database.refresh_analytics_snapshot()
+    print(f"Snapshot refresh (archives exported): {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    database.refresh_analytics_snapshot()
+    print(f"Snapshot refresh (archive export reused): {time.perf_counter() - start:.2f}s")
+
+    # sqlite and duckdb are measured on an idle database (duckdb would refresh before every call
+    # otherwise); 'auto' is measured while sales are being recorded, so its snapshot is never
+    # current: the chart aggregates stay on DuckDB within ANALYTICS_MAX_LAG, the rest use SQLite
+    idle = [(best_of(lambda: fn('sqlite'), args.repeat), best_of(lambda: fn('duckdb'), args.repeat)) for _, fn, _ in REPORTS]
+
+    product_ids = database.get_inventory(columns=['id'])['id'].tolist()
+    stop = threading.Event()
+    writer = threading.Thread(target=run_writer, args=(stop, args.write_rate, product_ids), daemon=True)
+    writer.start()
+
+    print(f"\n   {'report':<32}{'sqlite s':>10}{'duckdb s':>10}{'speedup':>9}{'auto s':>10}{'auto duckdb':>13}")
+    print(f"   (auto: median with {args.write_rate:g} sales/s being recorded, max lag {database.ANALYTICS_MAX_LAG}s)")
+    for (name, fn, allow_lag), (sqlite_time, duckdb_time) in zip(REPORTS, idle):
+        engines = []
+        def auto():
+            engines.append(database._resolve_engine('auto', allow_lag=allow_lag))
+            fn('auto')
+        auto_time = median_of(auto, args.repeat)
+        share = engines.count('duckdb') / len(engines)
+        print(f"   {name:<32}{sqlite_time:>10.3f}{duckdb_time:>10.3f}{sqlite_time / duckdb_time:>8.1f}x{auto_time:>10.3f}{share:>12.0%}")
+    stop.set()
+    writer.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark for login (scrypt) vs session checks (signed token + TTL cache) under concurrent users.
+
+    python bench_auth.py --users 16 --rounds 20
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, -(-len(sorted_values) * pct // 100) - 1))
+    return sorted_values[int(rank)]
+
+def report(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    print(f"   {label:<28}{len(latencies):>8}{len(latencies) / elapsed:>12.0f}"
+          f"{percentile(latencies, 50) * 1000:>10.3f}{percentile(latencies, 95) * 1000:>10.3f}{percentile(latencies, 99) * 1000:>10.3f}")
+
+def run_concurrent(fn, items, workers):
+    """Call fn on every item from `workers` threads; return (latencies, results, elapsed)."""
+    def timed(item):
+        start = time.perf_counter()
+        result = fn(item)
+        return time.perf_counter() - start, result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(timed, items))
+    elapsed = time.perf_counter() - start
+    return [o[0] for o in outcomes], [o[1] for o in outcomes], elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login and session-check latency.")
+    parser.add_argument("--users", type=int, default=16, help="Concurrent users (threads)")
+    parser.add_argument("--rounds", type=int, default=20, help="Session checks per user (one per simulated rerun)")
+    args = parser.parse_args()
+
+    database.DB_NAME = os.path.join(tempfile.mkdtemp(prefix="pharma_auth_"), "auth.db")
+    database.init_db()
+
+    # Import after DB_NAME is set; auth reads the database through database.get_connection
+    import auth
+    for i in range(args.users):
+        auth.create_user(f"staff{i}", f"password{i}", "Attendee", f"Staff {i}")
+
+    print(f"{args.users} concurrent users, {args.rounds} reruns each\n")
+    print(f"   {'operation':<28}{'calls':>8}{'calls/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+    latencies, users, elapsed = run_concurrent(lambda i: auth.login_user(f"staff{i}", f"password{i}"), range(args.users), args.users)
+    assert all(users), "login failed"
+    report("login (scrypt)", latencies, elapsed)
+
+    latencies, _, elapsed = run_concurrent(lambda i: auth.login_user(f"staff{i}", "wrong"), range(args.users), args.users)
+    report("failed login (scrypt)", latencies, elapsed)
+
+    tokens = [auth.create_session(user) for user in users]
+
+    # Cold: clear the cache so every check verifies the signature and reloads the user
+    auth._session_cache.clear()
+    latencies, results, elapsed = run_concurrent(auth.verify_session, tokens, args.users)
+    assert all(results), "session check failed"
+    report("session check (cold)", latencies, elapsed)
+
+    latencies, results, elapsed = run_concurrent(auth.verify_session, tokens * args.rounds, args.users)
+    assert all(results), "session check failed"
+    report("session check (cached)", latencies, elapsed)
+
+    def rerun_without_sessions(i):
+        return auth.login_user(f"staff{i % args.users}", f"password{i % args.users}")
+    latencies, _, elapsed = run_concurrent(rerun_without_sessions, range(args.users * min(args.rounds, 3)), args.users)
+    report("rerun re-hashing password", latencies, elapsed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Memory benchmark for the read functions: plain read_sql_query frames vs compact frames.
+
+    python bench_dataframes.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import database
+
+def generate_history(path, rows, products=500, seed=7):
+    """Create a database with `rows` sales and rows // 10 deliveries spread over two years."""
+    if os.path.exists(path):
+        os.remove(path)
+    database.DB_NAME = path
+    database.init_db()
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO products (name, brand, quantity, price, min_stock_level) VALUES (?, ?, ?, ?, ?)",
+        [(f"Product {i}", f"Brand {i % 40}", 1000, round(rng.uniform(1, 50), 2), 10) for i in range(products)]
+    )
+    c.execute("SELECT id, price FROM products")
+    catalog = c.fetchall()
+    attendees = [f"Attendee {i}" for i in range(12)]
+
+    def timestamp():
+        return f"{rng.choice((2025, 2026))}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(8, 20):02d}:{rng.randint(0, 59):02d}:00"
+
+    batch = []
+    for _ in range(rows):
+        product_id, price = rng.choice(catalog)
+        qty = rng.randint(1, 5)
+        batch.append((product_id, qty, price * qty, timestamp(), rng.choice(attendees)))
+        if len(batch) == 100000:
+            c.executemany("INSERT INTO sales (product_id, quantity, total_price, sale_date, attendee_name) VALUES (?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        c.executemany("INSERT INTO sales (product_id, quantity, total_price, sale_date, attendee_name) VALUES (?, ?, ?, ?, ?)", batch)
+
+    c.executemany(
+        "INSERT INTO deliveries (product_id, quantity, delivery_date, attendee_name, status, cost_price) VALUES (?, ?, ?, ?, ?, ?)",
+        [(rng.choice(catalog)[0], rng.randint(10, 100), timestamp(), rng.choice(attendees),
+          rng.choice(("Received", "Received", "Scheduled")), round(rng.uniform(1, 30), 2)) for _ in range(rows // 10)]
+    )
+    conn.commit()
+    conn.close()
+
+def measure(label, fn):
+    start = time.perf_counter()
+    df = fn()
+    elapsed = time.perf_counter() - start
+    mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"   {label:<44}{len(df):>10} rows {mb:>10.1f} MB {elapsed:>8.2f}s")
+    return mb
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory of plain vs compact read frames.")
+    parser.add_argument("--rows", type=int, default=1000000, help="Number of sales rows to generate")
+    parser.add_argument("--db", help="Path for the generated database (default: a temp file)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="pharma_bench_"), "bench.db")
+    print(f"Generating {args.rows} sales rows in {db_path}...")
+    generate_history(db_path, args.rows)
+
+    total_before = total_after = 0
+    for name, fn in [
+        ("get_inventory", database.get_inventory),
+        ("get_sales_data", database.get_sales_data),
+        ("get_all_deliveries", database.get_all_deliveries),
+    ]:
+        print(f"\n{name}")
+        total_before += measure("plain read_sql_query", lambda: fn(compact=False))
+        total_after += measure("compact", fn)
+
+    print("\nget_sales_data projection")
+    measure("compact, columns=[sale_date, total_price]", lambda: database.get_sales_data(columns=['sale_date', 'total_price']))
+
+    print(f"\nPer-session total: {total_before:.1f} MB -> {total_after:.1f} MB ({total_before / total_after:.1f}x smaller)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import pandas as pd
+import plotly.io as pio
+
+# Slices/bars beyond this are folded into a single "Other" entry
+TOP_N = 10
+OTHER_LABEL = "Other"
+
+# Built figures are kept as JSON, keyed on (chart key, data version)
+FIGURE_CACHE_SIZE = 64
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+_MISSING = object()
+
+def group_long_tail(df, label_col, value_col, top_n=TOP_N):
+    """Keep the top_n labels by value and sum everything else into an 'Other' row."""
+    grouped = df.groupby(label_col, as_index=False, observed=True)[value_col].sum()
+    grouped = grouped.sort_values(value_col, ascending=False)
+    if len(grouped) <= top_n:
+        return grouped.reset_index(drop=True)
+
+    head = grouped.iloc[:top_n].astype({label_col: object})
+    other = pd.DataFrame({label_col: [OTHER_LABEL], value_col: [grouped.iloc[top_n:][value_col].sum()]})
+    return pd.concat([head, other], ignore_index=True)
+
+def choose_bucket(start, end):
+    """Pick a time bucket that keeps a chart over [start, end] to roughly 100 points or fewer."""
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    if span <= pd.Timedelta(days=2):
+        return 'hour'
+    if span <= pd.Timedelta(days=92):
+        return 'day'
+    if span <= pd.Timedelta(days=730):
+        return 'week'
+    return 'month'
+
+def cached_figure(key, version, build):
+    """
+    Return the figure for key at the given data version, calling build() only on a miss.
+    build should do its own data loading so a cache hit skips the queries as well.
+    build may return None (nothing to plot); that result is cached too.
+    """
+    cache_key = (key, version)
+    with _figure_cache_lock:
+        cached = _figure_cache.get(cache_key, _MISSING)
+        if cached is not _MISSING:
+            _figure_cache.move_to_end(cache_key)
+    if cached is not _MISSING:
+        return None if cached is None else pio.from_json(cached)
+
+    # Built outside the lock so a slow query doesn't block other sessions
+    fig = build()
+    with _figure_cache_lock:
+        _figure_cache[cache_key] = None if fig is None else fig.to_json()
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    return fig
+
+def clear_figure_cache():
+    with _figure_cache_lock:
+        _figure_cache.clear()
+
+def current_hour():
+    """Cache-key component for charts over a window relative to 'now'."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H')
@@ -1,9 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
 import sqlite3
+import threading
+import time
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
 
 DB_NAME = 'pharma.db'
 
+# Seconds a connection waits on a locked database before raising 'database is locked'
+DB_TIMEOUT = 5.0
+
+# Tables whose writes bump a counter in data_versions
+VERSIONED_TABLES = ('products', 'sales', 'deliveries')
+
+# Closed months of these tables are moved out to per-year archive databases
+ARCHIVE_DIR = 'archive'
+ARCHIVED_TABLES = {
+    'sales': ('sale_date', ['id', 'product_id', 'quantity', 'total_price', 'sale_date', 'attendee_name']),
+    'deliveries': ('delivery_date', ['id', 'product_id', 'quantity', 'delivery_date', 'attendee_name', 'status', 'cost_price']),
+}
+# SQLite's default limit on attached databases per connection. Archives past
+# MAX_ATTACHED - 2 are copied into one in-memory database a batch at a time.
+MAX_ATTACHED = 10
+
+# Selectable columns of the read functions, mapped to their SQL expressions
+INVENTORY_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'brand': 'brand',
+    'quantity': 'quantity',
+    'price': 'price',
+    'min_stock_level': 'min_stock_level',
+}
+SALES_COLUMNS = {
+    'sale_date': 's.sale_date',
+    'name': 'p.name',
+    'brand': 'p.brand',
+    'quantity': 's.quantity',
+    'total_price': 's.total_price',
+    'attendee_name': 's.attendee_name',
+}
+DELIVERY_COLUMNS = {
+    'Date': 'd.delivery_date',
+    'Product': 'p.name',
+    'Brand': 'p.brand',
+    'Qty': 'd.quantity',
+    'Unit Cost': 'd.cost_price',
+    'Total Cost': '(d.quantity * d.cost_price)',
+    'Status': 'd.status',
+    'Handler': 'd.attendee_name',
+}
+# Columns returned by default (sales attendee_name is available on request only)
+DEFAULT_SALES_COLUMNS = ['sale_date', 'name', 'brand', 'quantity', 'total_price']
+
+# Repeated strings stored as categoricals, and timestamp text parsed to datetimes
+CATEGORY_COLUMNS = {'name', 'brand', 'status', 'attendee_name', 'Product', 'Brand', 'Status', 'Handler'}
+DATE_COLUMNS = {'sale_date', 'delivery_date', 'Date'}
+
+# Accepted header names in supplier price-list files (lowercased, spaces and dashes
+# read as underscores), mapped to supplier_prices columns
+PRICE_LIST_HEADERS = {
+    'product': 'product_name', 'product_name': 'product_name', 'name': 'product_name', 'item': 'product_name',
+    'supplier': 'supplier_name', 'supplier_name': 'supplier_name',
+    'email': 'supplier_email', 'supplier_email': 'supplier_email',
+    'price': 'unit_price', 'unit_price': 'unit_price', 'cost': 'unit_price', 'unit_cost': 'unit_price',
+    'date': 'price_date', 'price_date': 'price_date',
+}
+
+# Engine for the analytical reads: 'sqlite', 'duckdb', or 'auto'. DuckDB reads Parquet
+# snapshots of the history; 'auto' uses it while the snapshot is current (chart aggregates
+# also while it is no more than ANALYTICS_MAX_LAG seconds old), and refreshes it in the
+# background. Writes always use SQLite.
+ANALYTICS_ENGINE = os.environ.get('PHARMA_ANALYTICS_ENGINE', 'auto')
+ANALYTICS_DIR = 'analytics'
+# Minimum seconds between background snapshot refreshes
+ANALYTICS_REFRESH_INTERVAL = 300
+# How far behind the live data 'auto' chart aggregates may be; covers one refresh still running
+ANALYTICS_MAX_LAG = 2 * ANALYTICS_REFRESH_INTERVAL
+# Tables exported to each snapshot generation (archived history is exported separately)
+SNAPSHOT_TABLES = ('products', 'archive_periods', 'sales', 'deliveries')
+# DuckDB types of the history tables in snapshots, so hot, archived and empty exports share one schema
+SNAPSHOT_HISTORY_TYPES = {
+    'sales': {'id': 'BIGINT', 'product_id': 'BIGINT', 'quantity': 'BIGINT', 'total_price': 'DOUBLE',
+              'sale_date': 'TIMESTAMP', 'attendee_name': 'VARCHAR'},
+    'deliveries': {'id': 'BIGINT', 'product_id': 'BIGINT', 'quantity': 'BIGINT', 'delivery_date': 'TIMESTAMP',
+                   'attendee_name': 'VARCHAR', 'status': 'VARCHAR', 'cost_price': 'DOUBLE'},
+}
+
+# SQL that differs between the analytics engines: timestamp parameters and
+# expressions that truncate a timestamp column to a chart bucket
+ANALYTICS_DIALECTS = {
+    'sqlite': {
+        'timestamp_param': '?',
+        'buckets': {
+            'hour': "strftime('%Y-%m-%d %H:00:00', {col})",
+            'day': "date({col})",
+            'week': "date({col}, '-6 days', 'weekday 1')",
+            'month': "strftime('%Y-%m-01', {col})",
+        },
+    },
+    'duckdb': {
+        'timestamp_param': 'CAST(? AS TIMESTAMP)',
+        'buckets': {
+            'hour': "date_trunc('hour', {col})",
+            'day': "date_trunc('day', {col})",
+            'week': "date_trunc('week', {col})",
+            'month': "date_trunc('month', {col})",
+        },
+    },
+}
+
+_duckdb_instance = None
+_duckdb_lock = threading.Lock()
+# Held while a snapshot refresh runs
+_snapshot_lock = threading.Lock()
+_snapshot_last_attempt = 0.0
+
+logger = logging.getLogger(__name__)
+
 def init_db():
     """Initialize the database with necessary tables."""
     conn = sqlite3.connect(DB_NAME)
@@ -48,6 +172,79 @@ def init_db():
         )
     ''')
 
+    # Data version counters, bumped by triggers so caches can key on them
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        c.execute("INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)", (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS bump_{table}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+                END
+            ''')
+
+    # Catalog of months moved to archive databases, with totals so all-time figures stay cheap
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS archive_periods (
+            period TEXT PRIMARY KEY,
+            archive_file TEXT NOT NULL,
+            sales_rows INTEGER DEFAULT 0,
+            sales_total REAL DEFAULT 0,
+            deliveries_rows INTEGER DEFAULT 0,
+            deliveries_cost REAL DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_sales_date ON sales (sale_date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_deliveries_date ON deliveries (delivery_date)')
+
+    # Supplier price catalog, imported from supplier price lists
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS supplier_prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            product_name TEXT NOT NULL,
+            supplier_name TEXT NOT NULL,
+            supplier_email TEXT,
+            unit_price REAL NOT NULL,
+            price_date DATE NOT NULL,
+            source_file TEXT,
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_supplier_prices_product ON supplier_prices (product_id, supplier_name, price_date)')
+    # One price per product, supplier and day; drop duplicates left by imports made before the index existed
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_supplier_prices_unique'")
+    if not c.fetchone():
+        c.execute('''
+            DELETE FROM supplier_prices WHERE id NOT IN (
+                SELECT MAX(id) FROM supplier_prices GROUP BY product_name COLLATE NOCASE, supplier_name, price_date
+            )
+        ''')
+        c.execute('CREATE UNIQUE INDEX idx_supplier_prices_unique ON supplier_prices (product_name COLLATE NOCASE, supplier_name, price_date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_supplier_prices_supplier ON supplier_prices (supplier_name, price_date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_supplier_prices_date ON supplier_prices (price_date)')
+
+    # Users Table (passwords are salted scrypt hashes, see auth.hash_password)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL,
+            name TEXT,
+            active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
     # Seed some initial data if empty
     c.execute('SELECT count(*) FROM products')
     if c.fetchone()[0] == 0:
@@ -79,15 +276,54 @@ def init_db():
     conn.close()
 
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    return sqlite3.connect(DB_NAME, timeout=DB_TIMEOUT)
 
-def get_inventory():
-    """Fetch all inventory items."""
+def get_data_version(*tables):
+    """Return the change counters for the given tables (all versioned tables if none given)."""
+    tables = tables or VERSIONED_TABLES
     conn = get_connection()
-    df = pd.read_sql_query("SELECT * FROM products", conn)
+    c = conn.cursor()
+    c.execute("SELECT table_name, version FROM data_versions")
+    versions = dict(c.fetchall())
     conn.close()
+    return tuple(versions.get(table, 0) for table in tables)
+
+def _select_list(columns, available):
+    """SQL select list for the requested columns (all if None), rejecting unknown names."""
+    columns = list(available) if columns is None else list(columns)
+    unknown = [col for col in columns if col not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return ", ".join(f'{available[col]} as "{col}"' for col in columns)
+
+def compact_frame(df):
+    """
+    Shrink a frame in place: categoricals for repeated strings, parsed datetimes,
+    and integer/float columns downcast where no value changes. 'id' columns keep
+    int64 since their values are passed back into queries.
+    """
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif col in DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce')
+        elif col == 'id':
+            continue
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif pd.api.types.is_float_dtype(df[col]):
+            downcast = df[col].astype(np.float32)
+            if np.array_equal(downcast.to_numpy(np.float64), df[col].to_numpy(), equal_nan=True):
+                df[col] = downcast
     return df
 
+def get_inventory(columns=None, compact=True):
+    """Fetch all inventory items, optionally only the given columns."""
+    conn = get_connection()
+    df = pd.read_sql_query(f"SELECT {_select_list(columns, INVENTORY_COLUMNS)} FROM products", conn)
+    conn.close()
+    return compact_frame(df) if compact else df
+
 def add_product_stock(product_id, quantity, attendee_name, cost_price=0):
     """Add stock to existing product and record delivery (Direct Receive)."""
     conn = get_connection()
@@ -114,6 +350,27 @@ def schedule_delivery(product_id, quantity, owner_name, cost_price=0):
     conn.commit()
     conn.close()
 
+def schedule_deliveries(lines, owner_name):
+    """
+    Schedule many deliveries in one transaction (Owner action). Does NOT update stock yet.
+    lines is an iterable of (product_id, quantity, cost_price). Returns (success, message);
+    on failure nothing is scheduled.
+    """
+    rows = [(int(product_id), int(quantity), owner_name, float(cost_price)) for product_id, quantity, cost_price in lines]
+    conn = get_connection()
+    c = conn.cursor()
+    
+    try:
+        c.executemany("INSERT INTO deliveries (product_id, quantity, attendee_name, status, cost_price) VALUES (?, ?, ?, 'Scheduled', ?)",
+                      rows)
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        return False, f"Scheduling deliveries failed: {e}"
+    finally:
+        conn.close()
+    return True, f"Scheduled {len(rows)} deliveries."
+
 def get_scheduled_deliveries():
     """Fetch all deliveries with status 'Scheduled'."""
     conn = get_connection()
@@ -153,52 +410,38 @@ def confirm_delivery(delivery_id, attendee_name):
     conn.close()
     return True, "Delivery confirmed and stock updated."
 
-def get_profit_data():
-    """Calculate total sales revenue and total delivery costs."""
-    conn = get_connection()
-    c = conn.cursor()
-    
-    # Total Revenue
-    c.execute("SELECT SUM(total_price) FROM sales")
-    result_sales = c.fetchone()[0]
-    total_sales = result_sales if result_sales else 0
-    
+def get_profit_data(engine=None):
+    """Calculate total sales revenue and total delivery costs (hot data plus archived totals)."""
+    # Total Revenue = all sales; archived months contribute their stored totals
     # Total Cost (Expenses) - Includes Scheduled AND Received? 
     # User said "Sales minus goods bought". Goods bought usually implies 'Received'. 
     # But if Owner 'schedules' it, they 'bought' it? Let's count all deliveries as expenses to be safe/conservative, 
     # or just confirmed ones. Let's do ALL to reflect the "Willing to pay" commitment.
     # Actually, committed cost vs actual cost. Let's stick to ALL deliveries for now as "Goods Bought".
     
-    c.execute("SELECT SUM(cost_price * quantity) FROM deliveries")
-    result_cost = c.fetchone()[0]
-    total_cost = result_cost if result_cost else 0
-    
-    conn.close()
-    return total_sales, total_cost
-
-    conn.close()
-    return total_sales, total_cost
-
-def get_all_deliveries():
-    """Fetch all deliveries (scheduled and received) for history log."""
-    conn = get_connection()
     query = '''
-        SELECT 
-            d.delivery_date as 'Date',
-            p.name as 'Product',
-            p.brand as 'Brand',
-            d.quantity as 'Qty',
-            d.cost_price as 'Unit Cost',
-            (d.quantity * d.cost_price) as 'Total Cost',
-            d.status as 'Status',
-            d.attendee_name as 'Handler'
-        FROM deliveries d
+        SELECT
+            (SELECT COALESCE(SUM(total_price), 0) FROM sales)
+                + (SELECT COALESCE(SUM(sales_total), 0) FROM archive_periods) as total_sales,
+            (SELECT COALESCE(SUM(cost_price * quantity), 0) FROM deliveries)
+                + (SELECT COALESCE(SUM(deliveries_cost), 0) FROM archive_periods) as total_cost
+    '''
+    row = read_history(query, archives=False, engine=_resolve_engine(engine)).iloc[0]
+    return float(row['total_sales']), float(row['total_cost'])
+
+def get_all_deliveries(start=None, end=None, columns=None, compact=True, engine=None):
+    """Fetch deliveries (scheduled and received) for history log, optionally within [start, end]."""
+    engine = _resolve_engine(engine)
+    where, params = _date_filter('d.delivery_date', start, end, engine)
+    query = f'''
+        SELECT {_select_list(columns, DELIVERY_COLUMNS)}
+        FROM deliveries_all d
         JOIN products p ON d.product_id = p.id
+        {where}
         ORDER BY d.delivery_date DESC
     '''
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    df = read_history(query, params, start, end, engine=engine)
+    return compact_frame(df) if compact else df
 
 def record_sale(product_id, quantity, attendee_name):
     """Record a sale and decrease stock. Returns True if successful, False if insufficient stock."""
@@ -231,17 +474,18 @@ def record_sale(product_id, quantity, attendee_name):
     conn.close()
     return True, "Sale recorded successfully"
 
-def get_sales_data():
-    """Fetch sales data for analysis."""
-    conn = get_connection()
-    query = '''
-        SELECT s.sale_date, p.name, p.brand, s.quantity, s.total_price 
-        FROM sales s
+def get_sales_data(start=None, end=None, columns=None, compact=True, engine=None):
+    """Fetch sales data for analysis, optionally within [start, end]."""
+    engine = _resolve_engine(engine)
+    where, params = _date_filter('s.sale_date', start, end, engine)
+    query = f'''
+        SELECT {_select_list(columns or DEFAULT_SALES_COLUMNS, SALES_COLUMNS)}
+        FROM sales_all s
         JOIN products p ON s.product_id = p.id
+        {where}
     '''
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    df = read_history(query, params, start, end, engine=engine)
+    return compact_frame(df) if compact else df
 
 def get_low_stock_products():
     """Fetch products that are below minimum stock level."""
@@ -249,3 +493,639 @@ def get_low_stock_products():
     df = pd.read_sql_query("SELECT * FROM products WHERE quantity <= min_stock_level", conn)
     conn.close()
     return df
+
+def get_sales_by_product(days=None, engine=None):
+    """Total revenue per product, largest first, optionally limited to the last N days. May lag under 'auto'."""
+    engine = _resolve_engine(engine, allow_lag=True)
+    start = days_ago(days) if days else None
+    where, params = _date_filter('s.sale_date', start, engine=engine)
+    query = f'''
+        SELECT p.name, SUM(s.total_price) as total_price
+        FROM sales_all s
+        JOIN products p ON s.product_id = p.id
+        {where}
+        GROUP BY p.name
+        ORDER BY total_price DESC
+    '''
+    return read_history(query, params, start, engine=engine)
+
+def get_sales_timeseries(bucket, days=None, engine=None):
+    """
+    Revenue per time bucket ('hour', 'day', 'week' or 'month'), optionally limited to the last N days.
+    May lag under 'auto'.
+    """
+    engine = _resolve_engine(engine, allow_lag=True)
+    start = days_ago(days) if days else None
+    bucket_expr = ANALYTICS_DIALECTS[engine]['buckets'][bucket].format(col='sale_date')
+    where, params = _date_filter('sale_date', start, engine=engine)
+    query = f'''
+        SELECT {bucket_expr} as period, SUM(total_price) as total_price, SUM(quantity) as quantity
+        FROM sales_all
+        {where}
+        GROUP BY period
+        ORDER BY period
+    '''
+    return read_history(query, params, start, engine=engine)
+
+def get_sales_date_range(engine=None):
+    """Return the (first, last) sale timestamps, or (None, None) if there are no sales. May lag under 'auto'."""
+    df = read_history("SELECT MIN(sale_date) as first, MAX(sale_date) as last FROM sales_all",
+                      engine=_resolve_engine(engine, allow_lag=True))
+    first, last = df.iloc[0]['first'], df.iloc[0]['last']
+    return (None, None) if pd.isna(first) else (first, last)
+
+def days_ago(days):
+    """UTC timestamp string N days before now, in SQLite's CURRENT_TIMESTAMP format."""
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+def _date_filter(column, start=None, end=None, engine='sqlite'):
+    """Build a WHERE clause and params restricting column to [start, end]."""
+    placeholder = ANALYTICS_DIALECTS[engine]['timestamp_param']
+    clauses, params = [], []
+    if start:
+        clauses.append(f"{column} >= {placeholder}")
+        params.append(str(start))
+    if end:
+        clauses.append(f"{column} <= {placeholder}")
+        params.append(str(end))
+    where = "WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params
+
+# --- Archival of closed periods ---
+
+def _archive_dir():
+    return os.path.join(os.path.dirname(DB_NAME), ARCHIVE_DIR)
+
+def _archive_path(archive_file):
+    return os.path.join(_archive_dir(), archive_file)
+
+def _init_archive(c, schema):
+    """Create the archived tables inside an attached archive database."""
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.sales (
+            id INTEGER PRIMARY KEY,
+            product_id INTEGER,
+            quantity INTEGER,
+            total_price REAL,
+            sale_date TIMESTAMP,
+            attendee_name TEXT
+        )
+    ''')
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.deliveries (
+            id INTEGER PRIMARY KEY,
+            product_id INTEGER,
+            quantity INTEGER,
+            delivery_date TIMESTAMP,
+            attendee_name TEXT,
+            status TEXT,
+            cost_price REAL
+        )
+    ''')
+    c.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_sales_date ON sales (sale_date)')
+    c.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_deliveries_date ON deliveries (delivery_date)')
+
+def _history_archive_paths(start=None, end=None):
+    """Paths of the archive databases holding months that overlap [start, end] (all if no range)."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute('''
+        SELECT DISTINCT archive_file FROM archive_periods
+        WHERE (? IS NULL OR period >= substr(?, 1, 7))
+          AND (? IS NULL OR period <= substr(?, 1, 7))
+        ORDER BY archive_file
+    ''', (start, start, end, end))
+    paths = [_archive_path(row[0]) for row in c.fetchall()]
+    conn.close()
+    return [path for path in paths if os.path.exists(path)]
+
+def _history_view_sql(hot_schema, archive_schemas):
+    """CREATE statements for the sales_all/deliveries_all views over hot and archived tables."""
+    statements = []
+    for table, (_, columns) in ARCHIVED_TABLES.items():
+        cols = ", ".join(columns)
+        parts = [f"SELECT {cols} FROM {schema}.{table}" for schema in [hot_schema] + archive_schemas]
+        statements.append(f"CREATE TEMP VIEW {table}_all AS " + " UNION ALL ".join(parts))
+    return statements
+
+def _attach_archives(c, paths):
+    """
+    Attach archive databases and return their schema names. Past the attach limit, the
+    remaining archives are copied into an in-memory 'archive_rest' database, attaching
+    each one only while it is copied.
+    """
+    direct, rest = paths[:MAX_ATTACHED - 2], paths[MAX_ATTACHED - 2:]
+    schemas = []
+    for i, path in enumerate(direct):
+        c.execute(f"ATTACH DATABASE ? AS archive_{i}", (path,))
+        schemas.append(f"archive_{i}")
+    if rest:
+        c.execute("ATTACH DATABASE ':memory:' AS archive_rest")
+        _init_archive(c, 'archive_rest')
+        for path in rest:
+            c.execute("ATTACH DATABASE ? AS archive_batch", (path,))
+            for table, (_, columns) in ARCHIVED_TABLES.items():
+                cols = ", ".join(columns)
+                c.execute(f"INSERT INTO archive_rest.{table} ({cols}) SELECT {cols} FROM archive_batch.{table}")
+            c.connection.commit()
+            c.execute("DETACH DATABASE archive_batch")
+        schemas.append('archive_rest')
+    return schemas
+
+def get_history_connection(start=None, end=None, archives=True):
+    """
+    Open a connection with temp views sales_all and deliveries_all spanning the hot tables
+    plus every archive database holding months that overlap [start, end].
+    With no range given, all archives are attached.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    schemas = _attach_archives(c, _history_archive_paths(start, end) if archives else [])
+    for statement in _history_view_sql('main', schemas):
+        c.execute(statement)
+    return conn
+
+# --- Columnar analytics snapshots (DuckDB over Parquet) ---
+# DuckDB's sqlite scanner ignores SQLite's file locks and can read half-committed
+# pages, so DuckDB only ever reads snapshots exported through sqlite3.
+
+def _snapshot_root():
+    stem = os.path.splitext(os.path.basename(DB_NAME))[0]
+    return os.path.join(os.path.dirname(DB_NAME), ANALYTICS_DIR, stem)
+
+def _read_snapshot_manifest():
+    try:
+        with open(os.path.join(_snapshot_root(), 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _get_duckdb():
+    """Process-wide in-memory DuckDB instance; each query runs on its own cursor."""
+    global _duckdb_instance
+    with _duckdb_lock:
+        if _duckdb_instance is None:
+            _duckdb_instance = duckdb.connect()
+        return _duckdb_instance
+
+def _write_parquet(cursor, frame, table, path):
+    """Write a frame to Parquet, casting history tables to SNAPSHOT_HISTORY_TYPES so every file has the same schema."""
+    types = SNAPSHOT_HISTORY_TYPES.get(table)
+    select = ", ".join(f"TRY_CAST({col} AS {type_}) AS {col}" for col, type_ in types.items()) if types else "*"
+    cursor.register('frame', frame)
+    cursor.execute(f"COPY (SELECT {select} FROM frame) TO '{path}' (FORMAT PARQUET)")
+    cursor.unregister('frame')
+
+def _archive_fingerprint(c):
+    """Hash of archive_periods; it changes whenever a month is archived."""
+    c.execute("SELECT period, archive_file, sales_rows, deliveries_rows, archived_at FROM archive_periods ORDER BY period")
+    rows = c.fetchall()
+    return hashlib.sha1(json.dumps(rows).encode()).hexdigest()[:16] if rows else None
+
+def _export_archive_snapshot(fingerprint):
+    """
+    Export every archive database to Parquet under archive_<fingerprint>, one file per archive
+    and table, unless that export already exists. Archives only change when a month is archived,
+    so one export serves every snapshot generation until then. Returns the directory name,
+    or None if no archive files exist.
+    """
+    name = f"archive_{fingerprint}"
+    target = os.path.join(_snapshot_root(), name)
+    if os.path.isdir(target):
+        return name
+    paths = _history_archive_paths()
+    if not paths:
+        return None
+    
+    staging = f"{target}.tmp_{os.getpid()}_{time.time_ns()}"
+    os.makedirs(staging)
+    cursor = _get_duckdb().cursor()
+    # Archives are read one at a time, each on its own connection, so memory is bounded by the largest archive
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        conn = sqlite3.connect(path, timeout=DB_TIMEOUT)
+        for table, (_, columns) in ARCHIVED_TABLES.items():
+            frame = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM {table}", conn)
+            _write_parquet(cursor, frame, table, os.path.join(staging, f"{table}_{stem}.parquet"))
+        conn.close()
+    cursor.close()
+    
+    # An archive_period that ran during the export may have left the files ahead of the fingerprint
+    conn = get_connection()
+    changed = _archive_fingerprint(conn.cursor()) != fingerprint
+    conn.close()
+    if changed:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise RuntimeError("Archives changed during the snapshot export; retry the refresh.")
+    
+    try:
+        os.rename(staging, target)
+    except OSError:
+        # Another process published the same export first
+        shutil.rmtree(staging, ignore_errors=True)
+    return name
+
+def _export_snapshot():
+    """Write a new snapshot generation and swap the manifest. Callers hold _snapshot_lock."""
+    global _snapshot_last_attempt
+    # Recorded up front so a failing export is throttled like a successful one
+    _snapshot_last_attempt = time.time()
+    conn = get_connection()
+    c = conn.cursor()
+    queries = {'products': "SELECT * FROM products", 'archive_periods': "SELECT * FROM archive_periods"}
+    for table, (_, columns) in ARCHIVED_TABLES.items():
+        queries[table] = f"SELECT {', '.join(columns)} FROM {table}"
+    
+    # Only the hot tables are read inside the transaction, which keeps the read lock short
+    c.execute("BEGIN")
+    c.execute("SELECT table_name, version FROM data_versions")
+    versions = dict(c.fetchall())
+    fingerprint = _archive_fingerprint(c)
+    frames = {table: pd.read_sql_query(query, conn) for table, query in queries.items()}
+    conn.commit()
+    conn.close()
+    
+    root = _snapshot_root()
+    os.makedirs(root, exist_ok=True)
+    archive = _export_archive_snapshot(fingerprint) if fingerprint else None
+    
+    generation = f"gen_{time.time_ns()}_{os.getpid()}"
+    os.makedirs(os.path.join(root, generation))
+    cursor = _get_duckdb().cursor()
+    for table, frame in frames.items():
+        _write_parquet(cursor, frame, table, os.path.join(root, generation, f"{table}.parquet"))
+    cursor.close()
+    del frames
+    
+    previous = _read_snapshot_manifest()
+    manifest = {'generation': generation, 'archive': archive,
+                'versions': [versions.get(t, 0) for t in VERSIONED_TABLES], 'created_at': time.time()}
+    tmp_path = os.path.join(root, f"manifest.{generation}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(root, 'manifest.json'))
+    
+    # Keep the previous generation (and its archive export) for readers that loaded the old manifest
+    generations = sorted(d for d in os.listdir(root) if d.startswith('gen_'))
+    for old in generations[:-2]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    keep = {archive, (previous or {}).get('archive')}
+    for old in os.listdir(root):
+        if old.startswith('archive_') and '.tmp_' not in old and old not in keep:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return manifest
+
+def refresh_analytics_snapshot(only_if_stale=False):
+    """
+    Export products, the hot sales/deliveries and archive_periods to Parquet in one SQLite read
+    transaction, stamped with the data_versions they were read at. Archived history is exported
+    once per change to archive_periods and shared between generations.
+    Each refresh writes a new generation directory and then swaps the manifest, so readers never mix generations.
+    Refreshes are serialized; with only_if_stale, a snapshot made current by another caller meanwhile is reused.
+    """
+    with _snapshot_lock:
+        manifest = _read_snapshot_manifest()
+        if only_if_stale and _snapshot_is_current(manifest):
+            return manifest
+        return _export_snapshot()
+
+def _refresh_snapshot_in_background():
+    """Start a refresh thread unless one is running or the last attempt, failed or not, was within ANALYTICS_REFRESH_INTERVAL."""
+    if time.time() - _snapshot_last_attempt < ANALYTICS_REFRESH_INTERVAL:
+        return
+    # Skip if a refresh is already running; the thread releases the lock when it finishes
+    if not _snapshot_lock.acquire(blocking=False):
+        return
+    if time.time() - _snapshot_last_attempt < ANALYTICS_REFRESH_INTERVAL:
+        _snapshot_lock.release()
+        return
+    
+    def run():
+        try:
+            _export_snapshot()
+        except Exception:
+            logger.exception("Analytics snapshot refresh failed")
+        finally:
+            _snapshot_lock.release()
+    threading.Thread(target=run, daemon=True).start()
+
+def _snapshot_is_current(manifest):
+    return manifest is not None and tuple(manifest['versions']) == get_data_version()
+
+def _snapshot_within_lag(manifest):
+    return manifest is not None and time.time() - manifest['created_at'] <= ANALYTICS_MAX_LAG
+
+def get_duckdb_connection(manifest=None):
+    """
+    Open a DuckDB cursor over the current Parquet snapshot, with the same table and
+    sales_all/deliveries_all names as get_history_connection.
+    """
+    manifest = manifest or _read_snapshot_manifest()
+    root = _snapshot_root()
+    directory = os.path.join(root, manifest['generation'])
+    cursor = _get_duckdb().cursor()
+    for table in SNAPSHOT_TABLES:
+        cursor.execute(f"CREATE TEMP VIEW {table} AS SELECT * FROM read_parquet('{os.path.join(directory, table)}.parquet')")
+    for table in ARCHIVED_TABLES:
+        if manifest.get('archive'):
+            source = f"read_parquet('{os.path.join(root, manifest['archive'], table)}_*.parquet')"
+        else:
+            source = f"{table} WHERE false"
+        cursor.execute(f"CREATE TEMP VIEW {table}_archive AS SELECT * FROM {source}")
+        cursor.execute(f"CREATE TEMP VIEW {table}_all AS SELECT * FROM {table} UNION ALL SELECT * FROM {table}_archive")
+    return cursor
+
+def _resolve_engine(engine=None, allow_lag=False):
+    """
+    Pick the analytics engine for a query. 'duckdb' refreshes a stale snapshot first.
+    'auto' uses DuckDB while the snapshot is current and refreshes a stale one in the background.
+    Reads that pass allow_lag (the chart aggregates) also use a stale snapshot up to
+    ANALYTICS_MAX_LAG old; row listings and totals stay on SQLite until the snapshot catches up.
+    """
+    engine = engine or ANALYTICS_ENGINE
+    if engine == 'sqlite' or (engine == 'auto' and duckdb is None):
+        return 'sqlite'
+    if duckdb is None:
+        raise RuntimeError("Analytics engine 'duckdb' requested but duckdb is not installed.")
+    
+    manifest = _read_snapshot_manifest()
+    if _snapshot_is_current(manifest):
+        return 'duckdb'
+    if engine == 'duckdb':
+        refresh_analytics_snapshot(only_if_stale=True)
+        return 'duckdb'
+    _refresh_snapshot_in_background()
+    return 'duckdb' if allow_lag and _snapshot_within_lag(manifest) else 'sqlite'
+
+def get_analytics_version(engine=None):
+    """
+    The data_versions that the chart aggregates on engine reflect right now: the snapshot's when
+    they run on DuckDB, otherwise the live ones. Use it to key caches of chart output.
+    """
+    if _resolve_engine(engine, allow_lag=True) == 'duckdb':
+        manifest = _read_snapshot_manifest()
+        if manifest is not None:
+            return tuple(manifest['versions'])
+    return get_data_version()
+
+def read_history(query, params=(), start=None, end=None, archives=True, engine='sqlite'):
+    """
+    Run an analytical query against the hot + archived history on the given engine
+    (resolve it with _resolve_engine first). The query may use sales_all, deliveries_all
+    and any hot table; SQL that differs between engines comes from ANALYTICS_DIALECTS.
+    """
+    if engine == 'duckdb':
+        # The snapshot always holds the full history; the date filter in the query does the rest
+        cursor = get_duckdb_connection()
+        df = cursor.execute(query, list(params)).df()
+        cursor.close()
+    else:
+        conn = get_history_connection(start, end, archives)
+        df = pd.read_sql_query(query, conn, params=list(params))
+        conn.close()
+    return df
+
+def get_archive_periods():
+    """List archived months with their row counts and totals."""
+    conn = get_connection()
+    df = pd.read_sql_query("SELECT * FROM archive_periods ORDER BY period DESC", conn)
+    conn.close()
+    return df
+
+def archive_period(period):
+    """
+    Move one closed month ('YYYY-MM') of sales and non-scheduled deliveries into that year's
+    archive database. Returns (success, message).
+    """
+    try:
+        valid = datetime.strptime(period, '%Y-%m').strftime('%Y-%m') == period
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        return False, f"Invalid period {period!r}, expected 'YYYY-MM'."
+    current_period = datetime.now(timezone.utc).strftime('%Y-%m')
+    if period >= current_period:
+        return False, f"{period} is not a closed period yet."
+    
+    os.makedirs(_archive_dir(), exist_ok=True)
+    archive_file = f"pharma_{period[:4]}.db"
+    
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("ATTACH DATABASE ? AS archive", (_archive_path(archive_file),))
+    _init_archive(c, 'archive')
+    
+    year, month = int(period[:4]), int(period[5:7])
+    period_start = f"{period}-01"
+    period_end = f"{year + month // 12:04d}-{month % 12 + 1:02d}-01"
+    
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        moved = {}
+        for table, (date_col, columns) in ARCHIVED_TABLES.items():
+            cols = ", ".join(columns)
+            where = f"{date_col} >= ? AND {date_col} < ?"
+            # Scheduled deliveries still have to be confirmed against the hot table
+            if table == 'deliveries':
+                where += " AND status != 'Scheduled'"
+            value = "total_price" if table == 'sales' else "cost_price * quantity"
+            
+            c.execute(f"SELECT COUNT(*), SUM({value}) FROM main.{table} WHERE {where}", (period_start, period_end))
+            moved[table] = c.fetchone()
+            c.execute(f"INSERT INTO archive.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE {where}", (period_start, period_end))
+            c.execute(f"DELETE FROM main.{table} WHERE {where}", (period_start, period_end))
+        
+        sales_rows, sales_total = moved['sales']
+        deliveries_rows, deliveries_cost = moved['deliveries']
+        if sales_rows or deliveries_rows:
+            c.execute('''
+                INSERT INTO archive_periods (period, archive_file, sales_rows, sales_total, deliveries_rows, deliveries_cost)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(period) DO UPDATE SET
+                    sales_rows = sales_rows + excluded.sales_rows,
+                    sales_total = sales_total + excluded.sales_total,
+                    deliveries_rows = deliveries_rows + excluded.deliveries_rows,
+                    deliveries_cost = deliveries_cost + excluded.deliveries_cost,
+                    archived_at = CURRENT_TIMESTAMP
+            ''', (period, archive_file, sales_rows, sales_total or 0, deliveries_rows, deliveries_cost or 0))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        conn.close()
+        return False, f"Archiving {period} failed: {e}"
+    
+    conn.close()
+    return True, f"Archived {period}: {sales_rows} sales, {deliveries_rows} deliveries."
+
+def archive_closed_periods(keep_months=3):
+    """Archive every month older than the last keep_months months (current month included)."""
+    now = datetime.now(timezone.utc)
+    month_index = now.year * 12 + now.month - 1 - (keep_months - 1)
+    cutoff = f"{month_index // 12:04d}-{month_index % 12 + 1:02d}"
+    
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute('''
+        SELECT strftime('%Y-%m', sale_date) as period FROM sales WHERE sale_date < ?
+        UNION
+        SELECT strftime('%Y-%m', delivery_date) FROM deliveries WHERE delivery_date < ? AND status != 'Scheduled'
+        ORDER BY period
+    ''', (cutoff, cutoff))
+    periods = [row[0] for row in c.fetchall()]
+    conn.close()
+    
+    return [archive_period(period) for period in periods]
+
+def vacuum_database(archive_file=None):
+    """VACUUM the hot database, or one archive database by file name, to reclaim space."""
+    path = _archive_path(archive_file) if archive_file else DB_NAME
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+
+# --- Supplier price catalog ---
+
+def import_supplier_prices(source, supplier_name=None, supplier_email=None, price_date=None):
+    """
+    Import a supplier price list (CSV path or file-like) into supplier_prices.
+    supplier_name/supplier_email/price_date fill in columns the file does not have.
+    Rows are matched to products by name, case-insensitively; re-importing a price for the same
+    product, supplier and date replaces it. Returns (success, message).
+    """
+    try:
+        df = pd.read_csv(source)
+    except Exception as e:
+        return False, f"Could not read price list: {e}"
+    
+    # When a file has several aliases for one column (e.g. both Name and Product), the first one is used
+    renames, ignored = {}, []
+    for col in df.columns:
+        target = PRICE_LIST_HEADERS.get(str(col).strip().lower().replace(' ', '_').replace('-', '_'))
+        if target is None:
+            continue
+        if target in renames.values() or (target in df.columns and target != col):
+            ignored.append(str(col))
+        else:
+            renames[col] = target
+    df = df.drop(columns=ignored).rename(columns=renames)
+    if df.columns.duplicated().any():
+        return False, f"Price list has conflicting columns: {', '.join(map(str, df.columns[df.columns.duplicated()]))}"
+    if supplier_name and 'supplier_name' not in df:
+        df['supplier_name'] = supplier_name
+    if supplier_email and 'supplier_email' not in df:
+        df['supplier_email'] = supplier_email
+    if 'price_date' not in df:
+        df['price_date'] = price_date or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    if 'supplier_email' not in df:
+        df['supplier_email'] = None
+    
+    missing = [col for col in ('product_name', 'supplier_name', 'unit_price') if col not in df]
+    if missing:
+        return False, f"Price list is missing columns: {', '.join(missing)}"
+    
+    df['unit_price'] = pd.to_numeric(df['unit_price'], errors='coerce')
+    df['price_date'] = pd.to_datetime(df['price_date'], errors='coerce').dt.strftime('%Y-%m-%d')
+    df = df.dropna(subset=['product_name', 'supplier_name', 'unit_price', 'price_date'])
+    df['product_name'] = df['product_name'].astype(str).str.strip()
+    if df.empty:
+        return False, "No valid price rows found."
+    
+    source_file = getattr(source, 'name', source if isinstance(source, str) else None)
+    source_file = os.path.basename(source_file) if source_file else None
+    
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT lower(name), id FROM products")
+    product_ids = dict(c.fetchall())
+    rows = [
+        (product_ids.get(row.product_name.lower()), row.product_name, str(row.supplier_name).strip(),
+         row.supplier_email if isinstance(row.supplier_email, str) else None,
+         float(row.unit_price), row.price_date, source_file)
+        for row in df.itertuples(index=False)
+    ]
+    c.executemany('''
+        INSERT INTO supplier_prices (product_id, product_name, supplier_name, supplier_email, unit_price, price_date, source_file)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(product_name COLLATE NOCASE, supplier_name, price_date) DO UPDATE SET
+            product_id = excluded.product_id,
+            supplier_email = COALESCE(excluded.supplier_email, supplier_email),
+            unit_price = excluded.unit_price,
+            source_file = excluded.source_file
+    ''', rows)
+    # Link rows from earlier imports whose product has since been added to inventory
+    c.execute('''
+        UPDATE supplier_prices
+        SET product_id = (SELECT id FROM products WHERE lower(products.name) = lower(supplier_prices.product_name))
+        WHERE product_id IS NULL
+    ''')
+    conn.commit()
+    conn.close()
+    
+    unmatched = sum(1 for row in rows if row[0] is None)
+    msg = f"Imported {len(rows)} prices."
+    if unmatched:
+        msg += f" {unmatched} rows did not match a product in inventory."
+    if ignored:
+        msg += f" Ignored duplicate columns: {', '.join(ignored)}."
+    return True, msg
+
+def get_current_prices(product_id=None, search=None):
+    """
+    Latest price from each supplier for each product, cheapest first.
+    Optionally restricted to one product or to product names containing search.
+    supplier_email is the supplier's most recent known email, so a price list without one keeps it.
+    """
+    conn = get_connection()
+    clauses, params = ["sp.product_id IS NOT NULL"], []
+    if product_id is not None:
+        clauses.append("sp.product_id = ?")
+        params.append(int(product_id))
+    if search:
+        clauses.append("sp.product_name LIKE ?")
+        params.append(f"%{search}%")
+    query = f'''
+        WITH latest AS (
+            SELECT sp.*, ROW_NUMBER() OVER (
+                PARTITION BY sp.product_id, sp.supplier_name ORDER BY sp.price_date DESC, sp.id DESC
+            ) as rn
+            FROM supplier_prices sp
+            WHERE {" AND ".join(clauses)}
+        )
+        SELECT l.product_id, p.name, l.supplier_name,
+            (SELECT e.supplier_email FROM supplier_prices e
+             WHERE e.supplier_name = l.supplier_name AND e.supplier_email IS NOT NULL
+             ORDER BY e.price_date DESC, e.id DESC LIMIT 1) as supplier_email,
+            l.unit_price, l.price_date
+        FROM latest l
+        JOIN products p ON l.product_id = p.id
+        WHERE l.rn = 1
+        ORDER BY p.name, l.unit_price
+    '''
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return df
+
+def get_best_prices(search=None):
+    """Cheapest current supplier price per product."""
+    df = get_current_prices(search=search)
+    return df.drop_duplicates(subset='product_id', keep='first').reset_index(drop=True)
+
+def get_cheapest_supplier(product_id):
+    """Return the cheapest current offer for a product as a dict, or None if there is none."""
+    df = get_current_prices(product_id=product_id)
+    if df.empty:
+        return None
+    return df.iloc[0].to_dict()
+
+def get_price_history(product_id):
+    """All catalog prices for a product, oldest first."""
+    conn = get_connection()
+    query = '''
+        SELECT price_date, supplier_name, unit_price
+        FROM supplier_prices
+        WHERE product_id = ?
+        ORDER BY price_date, supplier_name
+    '''
+    df = pd.read_sql_query(query, conn, params=(int(product_id),))
+    conn.close()
+    return df
@@ -0,0 +1,281 @@
+"""
+Load harness: simulates N attendees/owners hitting a generated copy of the database.
+
+    python load_test.py scenarios/busy_day.json
+    python load_test.py scenarios/busy_day.json --workers 32 --mode process --json report.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+
+import database
+
+DEFAULT_SCENARIO = {
+    "name": "default",
+    "mode": "thread",             # "thread" or "process"
+    "workers": 8,
+    "duration": 10,               # seconds each worker runs
+    "products": 200,
+    "initial_stock": 1000,
+    "scheduled_deliveries": 500,
+    "db_timeout": 5.0,            # sqlite busy timeout per connection
+    "max_retries": 5,             # harness-level retries on 'database is locked'
+    "retry_backoff": 0.05,
+    "think_time": 0.0,            # seconds to sleep between operations
+    "engine": "sqlite",           # analytics engine for the read operations: sqlite, duckdb or auto
+    "seed": 42,
+    "mix": {
+        "record_sale": 70,
+        "confirm_delivery": 10,
+        "add_product_stock": 10,
+        "get_sales_data": 5,
+        "get_profit_data": 5
+    }
+}
+
+def load_scenario(path=None, **overrides):
+    """Read a scenario file over the defaults, then apply any non-None overrides."""
+    scenario = dict(DEFAULT_SCENARIO)
+    if path:
+        with open(path) as f:
+            scenario.update(json.load(f))
+    scenario.update({k: v for k, v in overrides.items() if v is not None})
+    return scenario
+
+def generate_database(path, scenario):
+    """Create a fresh database with the scenario's products and scheduled deliveries."""
+    if os.path.exists(path):
+        os.remove(path)
+    database.DB_NAME = path
+    database.init_db()
+
+    rng = random.Random(scenario["seed"])
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("DELETE FROM products")
+    c.executemany(
+        "INSERT INTO products (name, brand, quantity, price, min_stock_level) VALUES (?, ?, ?, ?, ?)",
+        [(f"Product {i}", f"Brand {i % 25}", scenario["initial_stock"], round(rng.uniform(1, 50), 2), 10)
+         for i in range(scenario["products"])]
+    )
+    c.execute("SELECT id FROM products")
+    product_ids = [row[0] for row in c.fetchall()]
+    c.executemany(
+        "INSERT INTO deliveries (product_id, quantity, attendee_name, status, cost_price) VALUES (?, ?, 'LoadOwner', 'Scheduled', ?)",
+        [(rng.choice(product_ids), rng.randint(1, 50), round(rng.uniform(1, 20), 2))
+         for _ in range(scenario["scheduled_deliveries"])]
+    )
+    conn.commit()
+
+    c.execute("SELECT id, quantity FROM products")
+    initial_stock = dict(c.fetchall())
+    c.execute("SELECT id FROM deliveries WHERE status = 'Scheduled'")
+    delivery_ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return initial_stock, delivery_ids
+
+def _call_with_retry(fn, args, scenario):
+    """Run fn(*args), retrying on 'database is locked'. Returns (result, retries)."""
+    retries = 0
+    while True:
+        try:
+            return fn(*args), retries
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or retries >= scenario["max_retries"]:
+                raise
+            retries += 1
+            time.sleep(scenario["retry_backoff"] * (2 ** retries) * random.random())
+
+def run_worker(db_path, scenario, worker_id, product_ids, delivery_ids):
+    """Run one simulated user until the scenario duration elapses. Returns a list of samples."""
+    database.DB_NAME = db_path
+    database.DB_TIMEOUT = scenario["db_timeout"]
+    rng = random.Random(scenario["seed"] + worker_id)
+    name = f"LoadUser{worker_id}"
+
+    operations = {
+        "record_sale": lambda: (database.record_sale, (rng.choice(product_ids), rng.randint(1, 3), name)),
+        "confirm_delivery": lambda: (database.confirm_delivery, (rng.choice(delivery_ids), name)),
+        "add_product_stock": lambda: (database.add_product_stock, (rng.choice(product_ids), rng.randint(1, 20), name, 2.5)),
+        "get_sales_data": lambda: (partial(database.get_sales_data, engine=scenario["engine"]), ()),
+        "get_profit_data": lambda: (partial(database.get_profit_data, engine=scenario["engine"]), ()),
+    }
+    op_names = list(scenario["mix"].keys())
+    weights = [scenario["mix"][op] for op in op_names]
+
+    samples = []
+    deadline = time.time() + scenario["duration"]
+    while time.time() < deadline:
+        op = rng.choices(op_names, weights)[0]
+        fn, args = operations[op]()
+        start = time.perf_counter()
+        outcome, retries = "ok", 0
+        try:
+            result, retries = _call_with_retry(fn, args, scenario)
+            # Write functions return (success, message); a False is a business rejection
+            if isinstance(result, tuple) and len(result) == 2 and result[0] is False:
+                outcome = "rejected"
+        except sqlite3.OperationalError as e:
+            outcome = "locked" if "locked" in str(e) else "error"
+        except Exception:
+            outcome = "error"
+        samples.append((op, time.perf_counter() - start, retries, outcome))
+
+        if scenario["think_time"]:
+            time.sleep(scenario["think_time"])
+    return samples
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def check_consistency(db_path, initial_stock, outcomes):
+    """Verify stock = initial + received deliveries - sales for every product, and row counts match successes."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        SELECT p.id, p.quantity,
+            COALESCE((SELECT SUM(quantity) FROM deliveries d WHERE d.product_id = p.id AND d.status = 'Received'), 0),
+            COALESCE((SELECT SUM(quantity) FROM sales s WHERE s.product_id = p.id), 0)
+        FROM products p
+    ''')
+    mismatched = []
+    negative = []
+    for product_id, quantity, received, sold in c.fetchall():
+        expected = initial_stock.get(product_id, 0) + received - sold
+        if quantity != expected:
+            mismatched.append({"product_id": product_id, "quantity": quantity, "expected": expected})
+        if quantity < 0:
+            negative.append(product_id)
+
+    c.execute("SELECT COUNT(*) FROM sales")
+    sales_rows = c.fetchone()[0]
+    c.execute("SELECT COUNT(*) FROM deliveries WHERE status = 'Received'")
+    received_rows = c.fetchone()[0]
+    conn.close()
+
+    expected_received = outcomes.get(("confirm_delivery", "ok"), 0) + outcomes.get(("add_product_stock", "ok"), 0)
+    return {
+        "stock_mismatches": mismatched[:20],
+        "stock_mismatch_count": len(mismatched),
+        "negative_stock_products": negative,
+        "sales_rows": sales_rows,
+        "successful_sales": outcomes.get(("record_sale", "ok"), 0),
+        "received_rows": received_rows,
+        "successful_receipts": expected_received,
+        "consistent": not mismatched and not negative
+            and sales_rows == outcomes.get(("record_sale", "ok"), 0)
+            and received_rows == expected_received
+    }
+
+def build_report(scenario, samples, elapsed, consistency):
+    by_op = {}
+    for op, latency, retries, outcome in samples:
+        by_op.setdefault(op, []).append((latency, retries, outcome))
+
+    operations = {}
+    for op, rows in sorted(by_op.items()):
+        latencies = sorted(latency for latency, _, _ in rows)
+        operations[op] = {
+            "count": len(rows),
+            "ok": sum(1 for _, _, o in rows if o == "ok"),
+            "rejected": sum(1 for _, _, o in rows if o == "rejected"),
+            "locked": sum(1 for _, _, o in rows if o == "locked"),
+            "errors": sum(1 for _, _, o in rows if o == "error"),
+            "retries": sum(r for _, r, _ in rows),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+        }
+
+    return {
+        "scenario": scenario,
+        "engine": scenario["engine"],
+        "elapsed": elapsed,
+        "total_operations": len(samples),
+        "throughput_ops": len(samples) / elapsed if elapsed else 0.0,
+        "lock_retries": sum(s[2] for s in samples),
+        "lock_failures": sum(1 for s in samples if s[3] == "locked"),
+        "operations": operations,
+        "consistency": consistency,
+    }
+
+def print_report(report):
+    scenario = report["scenario"]
+    print(f"Scenario: {scenario['name']} ({scenario['workers']} {scenario['mode']} workers, {scenario['duration']}s, "
+          f"{report['engine']} reads)")
+    print(f"Operations: {report['total_operations']} in {report['elapsed']:.1f}s -> {report['throughput_ops']:.1f} ops/s")
+    print(f"Lock retries: {report['lock_retries']}, lock failures: {report['lock_failures']}")
+    print()
+    print(f"{'operation':<20}{'count':>8}{'ok':>8}{'rej':>6}{'lock':>6}{'err':>6}{'retry':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for op, stats in report["operations"].items():
+        print(f"{op:<20}{stats['count']:>8}{stats['ok']:>8}{stats['rejected']:>6}{stats['locked']:>6}{stats['errors']:>6}"
+              f"{stats['retries']:>7}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+    print()
+
+    consistency = report["consistency"]
+    status = "✅ consistent" if consistency["consistent"] else "❌ INCONSISTENT"
+    print(f"Stock consistency: {status}")
+    print(f"   sales rows {consistency['sales_rows']} / successful sales {consistency['successful_sales']}")
+    print(f"   received rows {consistency['received_rows']} / successful receipts {consistency['successful_receipts']}")
+    if consistency["stock_mismatch_count"]:
+        print(f"   {consistency['stock_mismatch_count']} products with stock != initial + received - sold")
+    if consistency["negative_stock_products"]:
+        print(f"   {len(consistency['negative_stock_products'])} products with negative stock")
+
+def run_scenario(scenario, db_path=None):
+    """Generate a database, run the workers and return the report dict."""
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix="pharma_load_"), "load.db")
+    initial_stock, delivery_ids = generate_database(db_path, scenario)
+    product_ids = list(initial_stock.keys())
+
+    executor_cls = ProcessPoolExecutor if scenario["mode"] == "process" else ThreadPoolExecutor
+    start = time.perf_counter()
+    with executor_cls(max_workers=scenario["workers"]) as executor:
+        futures = [executor.submit(run_worker, db_path, scenario, i, product_ids, delivery_ids)
+                   for i in range(scenario["workers"])]
+        samples = [sample for future in futures for sample in future.result()]
+    elapsed = time.perf_counter() - start
+
+    outcomes = {}
+    for op, _, _, outcome in samples:
+        outcomes[(op, outcome)] = outcomes.get((op, outcome), 0) + 1
+
+    consistency = check_consistency(db_path, initial_stock, outcomes)
+    report = build_report(scenario, samples, elapsed, consistency)
+    report["database"] = db_path
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test against a generated pharma database.")
+    parser.add_argument("scenario", nargs="?", help="Scenario JSON file (see scenarios/)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--mode", choices=["thread", "process"])
+    parser.add_argument("--duration", type=float)
+    parser.add_argument("--engine", choices=["sqlite", "duckdb", "auto"], help="Analytics engine for the read operations")
+    parser.add_argument("--db", help="Path for the generated database (default: a temp file)")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario, workers=args.workers, mode=args.mode, duration=args.duration,
+                             engine=args.engine)
+    report = run_scenario(scenario, db_path=args.db)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
+import streamlit as st
 import google.generativeai as genai
 
 # Mock Email Function for Prototype
@@ -58,6 +59,84 @@ def send_supplier_email(supplier_email, product_name, quantity, owner_name):
         print("-------------------------------------------")
         return True, "Email sent successfully (Mock Mode - Configure secrets for real email)"
 
+def format_supplier_order(lines, owner_name):
+    """
+    Build the subject and body of one consolidated order.
+    lines is a list of dicts with product_name, quantity and unit_price.
+    """
+    subject = f"Order Request: {len(lines)} item{'s' if len(lines) != 1 else ''}"
+    total = sum(line['quantity'] * line['unit_price'] for line in lines)
+    rows = "\n".join(
+        f"    - {line['product_name']}: {line['quantity']} units @ ${line['unit_price']:,.2f} (${line['quantity'] * line['unit_price']:,.2f})"
+        for line in lines
+    )
+    body = f"""
+    Dear Supplier,
+    
+    We would like to place an order for the following:
+    
+{rows}
+    
+    Estimated total: ${total:,.2f}
+    
+    Please confirm availability and delivery date.
+    
+    Best regards,
+    {owner_name}
+    """
+    return subject, body
+
+def send_supplier_orders(orders, owner_name):
+    """
+    Send one consolidated order email per supplier over a single SMTP session.
+    orders maps supplier email -> list of order lines (see format_supplier_order).
+    Returns a dict of supplier email -> (success, message).
+    """
+    email_sender = None
+    email_password = None
+    
+    try:
+        email_sender = st.secrets["EMAIL_ADDRESS"]
+        email_password = st.secrets["EMAIL_PASSWORD"]
+    except Exception:
+        # Fallback for prototype if secrets are not set
+        print("Secrets for email not found. Using Mock.")
+    
+    messages = {supplier_email: format_supplier_order(lines, owner_name) for supplier_email, lines in orders.items()}
+    results = {}
+    
+    if email_sender and email_password:
+        try:
+            server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
+            server.login(email_sender, email_password)
+        except Exception as e:
+            return {supplier_email: (False, f"Failed to send email: {str(e)}") for supplier_email in orders}
+        
+        for supplier_email, (subject, body) in messages.items():
+            try:
+                msg = MIMEMultipart()
+                msg['From'] = email_sender
+                msg['To'] = supplier_email
+                msg['Subject'] = subject
+                msg.attach(MIMEText(body, 'plain'))
+                server.send_message(msg)
+                results[supplier_email] = (True, f"Order sent to {supplier_email}")
+            except Exception as e:
+                results[supplier_email] = (False, f"Failed to send email: {str(e)}")
+        try:
+            server.quit()
+        except Exception:
+            pass
+    else:
+        # PROTOTYPE: Just print to console or return success string
+        for supplier_email, (subject, body) in messages.items():
+            print(f"--- MOCK EMAIL SENT TO {supplier_email} ---")
+            print(subject)
+            print(body)
+            print("-------------------------------------------")
+            results[supplier_email] = (True, f"Order sent to {supplier_email} (Mock Mode)")
+    return results
+
 def get_ai_response(prompt, api_key=None):
     """
     Get response from AI model.
@@ -1,30 +1,75 @@
-from database import init_db, get_inventory, add_product_stock, record_sale, get_sales_data
-from auth import login_user
+import database
+from database import (init_db, get_inventory, add_product_stock, record_sale, get_sales_data, get_profit_data,
+                      archive_period, schedule_deliveries, get_scheduled_deliveries, import_supplier_prices,
+                      get_cheapest_supplier, get_price_history)
+import auth
+from auth import (login_user, ensure_default_users, create_session, verify_session, revoke_session, has_users,
+                  create_first_owner, create_user)
 from utils import send_supplier_email, get_ai_response
+import io
 import os
+import tempfile
+
+def use_scratch_database(name):
+    """Point the database module at a fresh temp database and initialize it. Returns the previous path."""
+    previous = database.DB_NAME
+    database.DB_NAME = os.path.join(tempfile.mkdtemp(prefix="pharma_verify_"), name)
+    init_db()
+    return previous
 
 def test_backend():
     print("1. Initializing Database...")
     try:
         init_db()
+        ensure_default_users()
         print("   ✅ DB Initialized")
     except Exception as e:
         print(f"   ❌ DB Init Failed: {e}")
         return
 
-    print("\n2. Testing Auth...")
-    user = login_user("owner", "admin")
-    if user and user['role'] == 'Owner':
+    print("\n2. Testing Auth (scratch database)...")
+    live_db = use_scratch_database("auth.db")
+    # Seeding with demo mode and PHARMA_OWNER_PASSWORD unset must create no accounts
+    demo_mode, owner_password = auth.DEMO_MODE, auth.OWNER_PASSWORD
+    auth.DEMO_MODE, auth.OWNER_PASSWORD = False, None
+    ensure_default_users()
+    auth.DEMO_MODE, auth.OWNER_PASSWORD = demo_mode, owner_password
+    if not has_users():
+        print("   ✅ No Built-in Accounts Outside Demo Mode")
+    else:
+        print("   ❌ Accounts Seeded Without Demo Mode")
+
+    create_first_owner("verify_owner", "owner-pass", "Verify Owner")
+    success, _ = create_first_owner("second_owner", "owner-pass", "Second Owner")
+    create_user("verify_attendee", "attendee-pass", "Attendee", "Verify Attendee")
+    user = login_user("verify_owner", "owner-pass")
+    if user and user['role'] == 'Owner' and not success:
         print("   ✅ Login Owner Successful")
     else:
         print("   ❌ Login Owner Failed")
     
-    user = login_user("attendee1", "user1")
+    user = login_user("verify_attendee", "attendee-pass")
     if user and user['role'] == 'Attendee':
         print("   ✅ Login Attendee Successful")
     else:
         print("   ❌ Login Attendee Failed")
 
+    if login_user("verify_attendee", "wrong") is None:
+        print("   ✅ Wrong Password Rejected")
+    else:
+        print("   ❌ Wrong Password Accepted")
+
+    token = create_session(user) if user else None
+    if token and verify_session(token) == user:
+        revoke_session(token)
+        if verify_session(token) is None:
+            print("   ✅ Session Token Working")
+        else:
+            print("   ❌ Revoked Session Still Valid")
+    else:
+        print("   ❌ Session Token Failed")
+    database.DB_NAME = live_db
+
     print("\n3. Testing Database Operations...")
     # Add stock
     print("   - Adding stock...")
@@ -64,7 +109,56 @@ def test_backend():
     except Exception as e:
         print(f"   ❌ Database Ops Error: {e}")
 
-    print("\n4. Testing Utils...")
+    print("\n4. Testing Archival, Deliveries and Price Lists (scratch database)...")
+    live_db = use_scratch_database("verify.db")
+    try:
+        df = get_inventory()
+        pid, name = int(df.iloc[0]['id']), df.iloc[0]['name']
+
+        # Back-date one sale into a closed month, then archive that month
+        record_sale(pid, 2, "TestBot")
+        conn = database.get_connection()
+        conn.execute("UPDATE sales SET sale_date = '2020-01-15 10:00:00'")
+        conn.commit()
+        conn.close()
+        record_sale(pid, 1, "TestBot")
+        profit_before = [round(v, 2) for v in get_profit_data(engine='sqlite')]
+        sales_before = len(get_sales_data(engine='sqlite'))
+
+        success, msg = archive_period("2020-01")
+        conn = database.get_connection()
+        hot_sales = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+        conn.close()
+        if (success and hot_sales == 1 and len(get_sales_data(engine='sqlite')) == sales_before
+                and [round(v, 2) for v in get_profit_data(engine='sqlite')] == profit_before):
+            print("   ✅ archive_period working")
+        else:
+            print(f"   ❌ Archiving changed the reports: {msg}")
+
+        # Schedule two deliveries in one call
+        scheduled_before = len(get_scheduled_deliveries())
+        success, msg = schedule_deliveries([(pid, 5, 2.0), (pid, 7, 2.5)], "TestBot")
+        if success and len(get_scheduled_deliveries()) == scheduled_before + 2:
+            print("   ✅ schedule_deliveries working")
+        else:
+            print(f"   ❌ schedule_deliveries failed: {msg}")
+
+        # Import a price list twice; the second import replaces rather than duplicates
+        price_list = f"Product Name,Supplier Name,Supplier Email,Unit Price\n{name},Verify Pharma,verify@test.com,3.25\n"
+        import_supplier_prices(io.StringIO(price_list), price_date="2026-01-01")
+        success, msg = import_supplier_prices(io.StringIO(price_list), price_date="2026-01-01")
+        offer = get_cheapest_supplier(pid)
+        if (success and offer and offer['supplier_name'] == "Verify Pharma" and offer['unit_price'] == 3.25
+                and offer['supplier_email'] == "verify@test.com" and len(get_price_history(pid)) == 1):
+            print("   ✅ import_supplier_prices working")
+        else:
+            print(f"   ❌ Price list round trip failed: {msg}")
+    except Exception as e:
+        print(f"   ❌ Data Movement Error: {e}")
+    finally:
+        database.DB_NAME = live_db
+
+    print("\n5. Testing Utils...")
     success, msg = send_supplier_email("test@test.com", "TestDrug", 100, "Owner")
     if success:
         print("   ✅ Email mock working")